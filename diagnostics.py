@@ -0,0 +1,150 @@
+import collections
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Optional, List
+from fastapi import Header, HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Funciones en las que un hilo está esperando trabajo, no ejecutándolo:
+# workers del executor bloqueados en la cola, el event loop en select, etc.
+IDLE_FRAMES = {
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+class SlowRequestLog:
+    """Conserva las K peticiones más lentas con su desglose por etapas.
+
+    Usa un min-heap de tamaño K. `would_keep` permite descartar una petición
+    rápida con una sola comparación, antes de construir su entrada.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def would_keep(self, total: float) -> bool:
+        if self.capacity <= 0:
+            return False
+        heap = self._heap
+        return len(heap) < self.capacity or total > heap[0][0]
+
+    def record(self, total: float, entry: dict):
+        if not self.would_keep(total):
+            return
+        item = (total, next(self._counter), entry)
+        with self._lock:
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif total > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [entry for _, _, entry in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+
+class TrafficLog:
+    """Registro muestreado de peticiones en formato JSON Lines compacto.
+
+    Cada línea es un objeto con claves cortas:
+    t (llegada, epoch), h (sha1 del texto) o text, sl/tl (idiomas pedidos),
+    dl (idioma detectado, ISO), sn (código NLLB de origen usado), n (caracteres),
+    nt (tokens), lat (s), st (HTTP).
+    """
+
+    def __init__(self, path: str, sample_rate: float, store_text: bool):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.store_text = store_text
+        self._file = open(path, "a", encoding="utf-8", buffering=1) if path else None
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self._file is not None and random.random() < self.sample_rate
+
+    def record(self, arrival: float, request, status: int,
+               latency: float, detected: Optional[str] = None, src_nllb: Optional[str] = None,
+               tokens: Optional[int] = None):
+        entry = {"t": round(arrival, 4)}
+        if self.store_text:
+            entry["text"] = request.text
+        else:
+            entry["h"] = hashlib.sha1(request.text.encode("utf-8")).hexdigest()[:16]
+        entry.update({
+            "sl": request.source_lang, "tl": request.target_lang, "dl": detected, "sn": src_nllb,
+            "n": len(request.text), "nt": tokens, "lat": round(latency, 4), "st": status,
+        })
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+def record_diagnostics(record, *args, **kwargs):
+    """Ejecuta un registro de diagnóstico sin que sus fallos afecten a la petición."""
+    try:
+        record(*args, **kwargs)
+    except Exception:
+        logger.warning("Diagnostic record failed", exc_info=True)
+
+def is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> str:
+    """Muestrea las pilas de todos los hilos durante `seconds` segundos.
+
+    Devuelve el formato "folded" (una pila por línea separada por ';' seguida
+    del número de muestras), compatible con flamegraph.pl y speedscope.
+    Es un perfil de tiempo real (wall-clock): por defecto se descartan los hilos
+    que están esperando trabajo (ver IDLE_FRAMES); `include_idle` los conserva.
+    No añade coste alguno al proceso mientras no se está ejecutando.
+    """
+    counts = collections.Counter()
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (not include_idle and is_idle(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {n}" for stack, n in counts.most_common()) + "\n"
+
+def admin_guard(token: str):
+    """Dependencia de FastAPI que exige la cabecera X-Admin-Token.
+
+    Sin token configurado los endpoints responden 404, como si no existieran.
+    """
+
+    def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+        if not token:
+            raise HTTPException(status_code=404, detail="Admin endpoints disabled")
+        if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), token.encode("utf-8")):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    return require_admin
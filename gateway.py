@@ -0,0 +1,244 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import Optional, List
+import httpx
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
+
+# --- CONFIGURACIÓN ---
+# Réplicas del traductor (misma imagen del Dockerfile), separadas por comas
+REPLICAS = [
+    url.strip().rstrip("/")
+    for url in os.getenv("GATEWAY_REPLICAS", "http://localhost:8000").split(",")
+    if url.strip()
+]
+# Nodos virtuales por réplica en el anillo de hashing consistente
+VIRTUAL_NODES = int(os.getenv("GATEWAY_VIRTUAL_NODES", "100"))
+# Cada cuánto se consulta /health de las réplicas (segundos)
+HEALTH_INTERVAL = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "2.0"))
+# Peticiones en curso + en cola a partir de las cuales una réplica se considera saturada
+MAX_QUEUE_DEPTH = int(os.getenv("GATEWAY_MAX_QUEUE_DEPTH", "4"))
+# Reintentos en otra réplica ante sobrecarga o réplica caída
+MAX_RETRIES = int(os.getenv("GATEWAY_MAX_RETRIES", "2"))
+REQUEST_TIMEOUT = float(os.getenv("GATEWAY_TIMEOUT", "120"))
+# Tiempo máximo para conectar: una réplica inalcanzable se salta en lugar de bloquear
+CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "2.0"))
+# Tiempo máximo de cada sondeo a /health
+HEALTH_TIMEOUT = float(os.getenv("GATEWAY_HEALTH_TIMEOUT", "2.0"))
+# Textos máximos por batch y cuántos se envían a la vez a las réplicas
+MAX_BATCH_SIZE = int(os.getenv("GATEWAY_MAX_BATCH_SIZE", "64"))
+BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8"))
+
+# Códigos que indican sobrecarga temporal (main.py responde 503 si se arranca con
+# MAX_QUEUED_REQUESTS): se reintenta en la siguiente réplica
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# --- SCHEMAS ---
+class TranslationRequest(BaseModel):
+    text: str
+    source_lang: Optional[str] = "auto"
+    target_lang: str = "spa_Latn"
+
+class BatchTranslationRequest(BaseModel):
+    texts: List[str] = Field(max_length=MAX_BATCH_SIZE)
+    source_lang: Optional[str] = "auto"
+    target_lang: str = "spa_Latn"
+
+# --- ENRUTADO ---
+def normalize_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.strip())
+
+def stable_hash(key: str) -> int:
+    # hash() de Python cambia entre procesos; necesitamos el mismo anillo en todas las instancias
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+def routing_key(text: str, source_lang: Optional[str], target_lang: str) -> str:
+    return f"{source_lang or 'auto'}|{target_lang}|{normalize_text(text)}"
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.reported_depth = 0  # Según el último /health (incluye tráfico de otros gateways)
+        self.in_flight = 0       # Peticiones enviadas por este gateway aún sin respuesta
+
+    @property
+    def load(self) -> int:
+        # El valor reportado puede tener hasta HEALTH_INTERVAL de retraso; el local es inmediato
+        return max(self.reported_depth, self.in_flight)
+
+class HashRing:
+    """Anillo de hashing consistente con nodos virtuales.
+
+    Añadir o quitar una réplica solo reasigna ~1/N de las claves, de modo que
+    el estado caliente de las demás réplicas se conserva.
+    """
+
+    def __init__(self, replicas: List[Replica], virtual_nodes: int):
+        points = sorted(
+            (stable_hash(f"{replica.url}#{i}"), index)
+            for index, replica in enumerate(replicas)
+            for i in range(virtual_nodes)
+        )
+        self.replicas = replicas
+        self._hashes = [h for h, _ in points]
+        self._owners = [index for _, index in points]
+
+    def candidates(self, key: str) -> List[Replica]:
+        """Réplicas distintas en el orden del anillo a partir de la clave."""
+        start = bisect.bisect(self._hashes, stable_hash(key))
+        seen, order = set(), []
+        for i in range(len(self._owners)):
+            index = self._owners[(start + i) % len(self._owners)]
+            if index not in seen:
+                seen.add(index)
+                order.append(self.replicas[index])
+                if len(order) == len(self.replicas):
+                    break
+        return order
+
+replicas = [Replica(url) for url in REPLICAS]
+ring = HashRing(replicas, VIRTUAL_NODES)
+
+def route(key: str) -> List[Replica]:
+    """Orden de intento para una clave.
+
+    Se respeta el orden del anillo (afinidad de caché), saltando réplicas caídas
+    o saturadas; si todas lo están, se prueban de menor a mayor carga.
+    """
+    order = ring.candidates(key)
+    healthy = [r for r in order if r.healthy] or order
+    available = [r for r in healthy if r.load < MAX_QUEUE_DEPTH]
+    saturated = sorted((r for r in healthy if r.load >= MAX_QUEUE_DEPTH), key=lambda r: r.load)
+    return available + saturated
+
+async def check_replica(client: httpx.AsyncClient, replica: Replica):
+    try:
+        response = await client.get(f"{replica.url}/health", timeout=HEALTH_TIMEOUT)
+        response.raise_for_status()
+        usage = response.json().get("resource_usage", {})
+        replica.reported_depth = usage.get("active_tasks_semaphore", 0) + usage.get("queued_requests", 0)
+        replica.healthy = True
+    except Exception:
+        # Cualquier respuesta inesperada marca la réplica como caída, pero nunca
+        # debe detener el sondeo (es lo único que la vuelve a marcar como sana)
+        replica.healthy = False
+
+async def poll_health(client: httpx.AsyncClient):
+    while True:
+        await asyncio.gather(*(check_replica(client, r) for r in replicas))
+        await asyncio.sleep(HEALTH_INTERVAL)
+
+async def forward(client: httpx.AsyncClient, payload: dict):
+    """Envía la petición a la réplica preferida y reintenta en las siguientes."""
+    key = routing_key(payload["text"], payload.get("source_lang"), payload["target_lang"])
+    last_error = "no replicas configured"
+    for replica in route(key)[:MAX_RETRIES + 1]:
+        replica.in_flight += 1
+        try:
+            response = await client.post(
+                f"{replica.url}/translate", json=payload,
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+        except httpx.ReadTimeout:
+            # Una traducción lenta no es sobrecarga: reintentarla solo duplicaría el trabajo
+            raise HTTPException(status_code=504, detail=f"Replica {replica.url} timed out")
+        except httpx.TransportError as e:
+            # Incluye ConnectTimeout/PoolTimeout: la réplica no es alcanzable, probamos la siguiente
+            replica.healthy = False
+            last_error = f"{replica.url}: {e.__class__.__name__}"
+            continue
+        finally:
+            replica.in_flight -= 1
+
+        if response.status_code in RETRYABLE_STATUS:
+            last_error = f"{replica.url}: HTTP {response.status_code}"
+            continue
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("detail")
+            except (ValueError, AttributeError):
+                detail = response.text
+            raise HTTPException(status_code=response.status_code, detail=detail)
+        try:
+            return replica, response.json()
+        except ValueError:
+            raise HTTPException(status_code=502, detail=f"Replica {replica.url} returned an invalid response")
+
+    raise HTTPException(status_code=503, detail=f"All replicas unavailable ({last_error})")
+
+# --- APP ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits) as client:
+        app.state.client = client
+        poller = asyncio.create_task(poll_health(client))
+        try:
+            yield
+        finally:
+            poller.cancel()
+
+app = FastAPI(title="NLLB Translator Gateway", lifespan=lifespan)
+
+@app.post("/translate")
+async def translate(request: TranslationRequest, response: Response):
+    replica, result = await forward(app.state.client, request.model_dump())
+    response.headers["X-Served-By"] = replica.url
+    return result
+
+@app.post("/translate/batch")
+async def translate_batch(request: BatchTranslationRequest):
+    """Reparte cada texto a su réplica (por hash) y los traduce en paralelo.
+
+    Un fallo no descarta el resto: `translations` lleva null en su posición y
+    `errors` indica el índice, el código de la réplica y el detalle. Solo si
+    fallan todos se responde con el código del primer error.
+    """
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def forward_item(text):
+        payload = {"text": text, "source_lang": request.source_lang, "target_lang": request.target_lang}
+        async with limit:
+            return await forward(app.state.client, payload)
+
+    results = await asyncio.gather(
+        *(forward_item(text) for text in request.texts), return_exceptions=True
+    )
+    translations, errors = [], []
+    for index, result in enumerate(results):
+        if isinstance(result, HTTPException):
+            translations.append(None)
+            errors.append({"index": index, "status": result.status_code, "detail": result.detail})
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            translations.append(result[1])
+
+    if errors and len(errors) == len(results):
+        raise HTTPException(status_code=errors[0]["status"], detail=errors[0]["detail"])
+    return {"translations": translations, "errors": errors}
+
+@app.get("/health")
+async def health_check():
+    """Estado del gateway y de cada réplica según el último sondeo."""
+    return {
+        "status": "healthy" if any(r.healthy for r in replicas) else "degraded",
+        "replicas": [
+            {
+                "url": r.url,
+                "healthy": r.healthy,
+                "reported_queue_depth": r.reported_depth,
+                "in_flight": r.in_flight,
+            }
+            for r in replicas
+        ],
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("GATEWAY_PORT", "8080")))
@@ -1,14 +1,17 @@
 import asyncio
 import fasttext
 import os
+import threading
 import ctranslate2
 import transformers
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import re
 import time
 import psutil
+from diagnostics import SlowRequestLog, TrafficLog, admin_guard, record_diagnostics, sample_stacks
 
 app = FastAPI(title="NLLB 1.3B Professional Agency API")
 
@@ -30,6 +33,32 @@ lang_model = fasttext.load_model("lid.176.ftz")
 
 # Semáforo para controlar la carga de trabajo paralela
 sem = asyncio.Semaphore(2)
+# Peticiones en espera a partir de las cuales se responde 503. Por defecto 0 (cola
+# ilimitada); solo conviene activarlo detrás de gateway.py, que reintenta en otra réplica
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "0"))
+
+# Opciones de decodificación (se registran junto a las peticiones lentas)
+DECODING_OPTIONS = {
+    "beam_size": 4, # Un poco más ligero para mejorar RPS
+    "num_hypotheses": 3,
+    "repetition_penalty": 1.2,
+    "no_repeat_ngram_size": 3,
+}
+
+# --- DIAGNÓSTICO ---
+# Token de administración: si no está definido, los endpoints /admin quedan deshabilitados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Número de peticiones más lentas que se conservan (0 = desactivado)
+SLOW_REQUESTS_K = int(os.getenv("SLOW_REQUESTS_K", "20"))
+PROFILE_MAX_SECONDS = 60.0
+
+# --- CAPTURA DE TRÁFICO ---
+# Ruta del log de tráfico (JSON Lines, append-only). Vacío = desactivado
+TRAFFIC_LOG_PATH = os.getenv("TRAFFIC_LOG_PATH", "")
+# Fracción de peticiones que se registran (0.0 - 1.0)
+TRAFFIC_LOG_SAMPLE_RATE = float(os.getenv("TRAFFIC_LOG_SAMPLE_RATE", "0.1"))
+# Si es "1" se guarda el texto original; por defecto solo su hash
+TRAFFIC_LOG_TEXT = os.getenv("TRAFFIC_LOG_TEXT", "0") == "1"
 
 # Mapeo profesional: ISO 639-1 (FastText) -> NLLB-200 
 LANG_MAP = {
@@ -75,6 +104,15 @@ def clean_output(text: str) -> str:
 def normalize_text(text: str) -> str:
     return re.sub(r'\s+', ' ', text.strip())
 
+slow_requests = SlowRequestLog(SLOW_REQUESTS_K)
+
+traffic_log = TrafficLog(TRAFFIC_LOG_PATH, TRAFFIC_LOG_SAMPLE_RATE, TRAFFIC_LOG_TEXT)
+
+# Solo se permite un perfilado a la vez
+profile_lock = threading.Lock()
+
+require_admin = admin_guard(ADMIN_TOKEN)
+
 def get_nllb_code(lang_input: str, text: str):
     default_nllb = "eng_Latn"
     
@@ -96,21 +134,38 @@ def get_nllb_code(lang_input: str, text: str):
         except Exception:
             return default_nllb, "en", 0.0
     
+    # Código NLLB completo (ej: "spa_Latn"): se usa tal cual
+    if re.fullmatch(r"[a-z]{3}_[A-Z][a-z]{3}", lang_input):
+        return lang_input, lang_input, 100.0
+
     # Si el usuario fuerza un idioma manual (ej: "es")
     return LANG_MAP.get(lang_input, f"{lang_input}_Latn"), lang_input, 100.0
 
 # --- ENDPOINTS ---
 @app.post("/translate", response_model=TranslationResponse)
 async def translate(request: TranslationRequest):
+    # La llegada se registra antes del descarte: la traza debe incluir las ráfagas
+    arrival = time.perf_counter()
+    arrival_ts = time.time()
+    sampled = traffic_log.should_sample()
+
+    # Descarte de carga: mejor un 503 inmediato (que el gateway reintenta en otra
+    # réplica) que una cola que crece sin límite
+    if MAX_QUEUED_REQUESTS and len(sem._waiters or ()) >= MAX_QUEUED_REQUESTS:
+        if sampled:
+            record_diagnostics(traffic_log.record, arrival_ts, request, 503, time.perf_counter() - arrival)
+        raise HTTPException(status_code=503, detail="Server overloaded", headers={"Retry-After": "1"})
     async with sem:
         start_time = time.perf_counter()
         try:
             src_nllb, iso_detected, confidence = get_nllb_code(request.source_lang, request.text)
+            detected_at = time.perf_counter()
             
             # Tokenización
             tokenizer.src_lang = src_nllb
             source_ids = tokenizer.encode(normalize_text(request.text))
             source_tokens = tokenizer.convert_ids_to_tokens(source_ids)
+            tokenized_at = time.perf_counter()
             
             # Ejecución en pool de hilos para no bloquear el loop de FastAPI
             loop = asyncio.get_running_loop()
@@ -119,12 +174,10 @@ async def translate(request: TranslationRequest):
                 lambda: translator.translate_batch(
                     source=[source_tokens],
                     target_prefix=[[request.target_lang]],
-                    beam_size=4, # Un poco más ligero para mejorar RPS
-                    num_hypotheses=3,
-                    repetition_penalty=1.2,
-                    no_repeat_ngram_size=3
+                    **DECODING_OPTIONS
                 )
             )
+            translated_at = time.perf_counter()
             
             # Procesamiento de hipótesis
             processed_hyps = []
@@ -133,9 +186,10 @@ async def translate(request: TranslationRequest):
                 decoded = tokenizer.decode(tokenizer.convert_tokens_to_ids(tokens))
                 processed_hyps.append(clean_output(decoded))
             
-            elapsed = time.perf_counter() - start_time
-            
-            return {
+            end_time = time.perf_counter()
+            elapsed = end_time - start_time
+
+            response = {
                 "alternatives": processed_hyps[1:] if len(processed_hyps) > 1 else [],
                 "detectedLanguage": {"confidence": confidence, "language": iso_detected},
                 "translatedText": processed_hyps[0],
@@ -143,8 +197,63 @@ async def translate(request: TranslationRequest):
             }
 
         except Exception as e:
+            if sampled:
+                record_diagnostics(traffic_log.record, arrival_ts, request, 500,
+                                   time.perf_counter() - arrival)
             raise HTTPException(status_code=500, detail=str(e))
 
+    # Los registros de diagnóstico van fuera del try: nunca convierten un éxito en error.
+    # La entrada lenta solo se construye si la petición entra entre las K más lentas
+    total = end_time - arrival
+    if slow_requests.would_keep(total):
+        record_diagnostics(slow_requests.record, total, {
+            "timestamp": time.time(),
+            "total_s": round(total, 4),
+            "stages_s": {
+                "queue_wait": round(start_time - arrival, 4),
+                "lang_detect": round(detected_at - start_time, 4),
+                "tokenize": round(tokenized_at - detected_at, 4),
+                "translate": round(translated_at - tokenized_at, 4),
+                "decode": round(end_time - translated_at, 4),
+            },
+            "source_lang": src_nllb,
+            "target_lang": request.target_lang,
+            "chars": len(request.text),
+            "source_tokens": len(source_tokens),
+            "output_tokens": [len(hyp) for hyp in results[0].hypotheses],
+            "decoding_options": DECODING_OPTIONS,
+        })
+    if sampled:
+        record_diagnostics(traffic_log.record, arrival_ts, request, 200, end_time - arrival,
+                           detected=iso_detected, src_nllb=src_nllb, tokens=len(source_tokens))
+
+    return response
+
+@app.post("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    include_idle: bool = False,
+):
+    """Perfila el proceso durante N segundos y devuelve pilas en formato folded."""
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, sample_stacks, seconds, interval_ms / 1000, include_idle)
+    finally:
+        profile_lock.release()
+
+@app.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    """Devuelve las peticiones más lentas registradas, de la más lenta a la más rápida."""
+    return {"capacity": slow_requests.capacity, "requests": slow_requests.snapshot()}
+
+@app.delete("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def clear_slow_requests():
+    slow_requests.clear()
+    return {"cleared": True}
+
 @app.get("/health")
 async def health_check():
     """Verifica la salud del servicio y el uso de recursos."""
@@ -160,7 +269,8 @@ async def health_check():
         "resource_usage": {
             "memory_física_mb": round(mem_rss, 2),
             "cpu_threads_total": os.cpu_count(),
-            "active_tasks_semaphore": 2 - sem._value # Cuántas están procesando ahora
+            "active_tasks_semaphore": 2 - sem._value, # Cuántas están procesando ahora
+            "queued_requests": len(sem._waiters or ()) # Cuántas esperan turno
         }
     }
 
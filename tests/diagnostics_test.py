@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from fastapi import HTTPException
+
+# Comprueba las piezas de diagnóstico sin cargar el modelo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diagnostics import SlowRequestLog, TrafficLog, admin_guard, record_diagnostics, sample_stacks  # noqa: E402
+import replay_trace  # noqa: E402
+
+class WordTokenizer:
+    """Tokenizador falso: una palabra = un token, más idioma y </s> como en NLLB."""
+    src_lang = None
+
+    def encode(self, text):
+        return text.split() + [self.src_lang, "</s>"]
+
+def status_of(call):
+    try:
+        call()
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+def run_checks():
+    checks = []
+
+    # 1. SlowRequestLog: conserva las K más lentas, ordenadas de mayor a menor
+    log = SlowRequestLog(3)
+    for total in [5, 1, 9, 3, 7, 2]:
+        if log.would_keep(total):
+            log.record(total, {"total": total})
+    checks.append(("Peticiones lentas: desalojo y orden", [e["total"] for e in log.snapshot()] == [9, 7, 5]))
+    checks.append(("Peticiones lentas: descarte barato", not log.would_keep(4) and log.would_keep(6)))
+    checks.append(("Peticiones lentas: K=0 desactiva", not SlowRequestLog(0).would_keep(100)))
+
+    # 2. record_diagnostics nunca propaga errores del registro
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+    logging.getLogger("diagnostics").disabled = True  # El aviso esperado no ensucia la salida
+    try:
+        record_diagnostics(broken, 1, entry={})
+        swallowed = True
+    except Exception:
+        swallowed = False
+    checks.append(("Errores de diagnóstico aislados", swallowed))
+
+    # 3. require_admin: 404 sin token configurado, 403 con token incorrecto
+    disabled, enabled = admin_guard(""), admin_guard("secreto")
+    checks.append(("Admin deshabilitado sin token", status_of(lambda: disabled(x_admin_token="secreto")) == 404))
+    checks.append(("Admin rechaza token incorrecto", status_of(lambda: enabled(x_admin_token="otro")) == 403))
+    checks.append(("Admin rechaza cabecera ausente", status_of(lambda: enabled(x_admin_token=None)) == 403))
+    checks.append(("Admin acepta token correcto", status_of(lambda: enabled(x_admin_token="secreto")) == 200))
+
+    # 4. sample_stacks: formato folded, sin hilos ociosos salvo que se pidan
+    def busy():
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            pass
+    idle_event = threading.Event()
+    threads = [threading.Thread(target=busy, name="busy"),
+               threading.Thread(target=idle_event.wait, name="idle")]
+    for t in threads:
+        t.start()
+    folded = sample_stacks(0.1, 0.01)
+    with_idle = sample_stacks(0.1, 0.01, include_idle=True)
+    idle_event.set()
+    for t in threads:
+        t.join()
+    lines = folded.strip().split("\n")
+    checks.append(("Perfil en formato folded", all(line.rsplit(" ", 1)[1].isdigit() for line in lines)))
+    checks.append(("Perfil descarta hilos ociosos", any(l.startswith("busy;") for l in lines)
+                   and not any(l.startswith("idle;") for l in lines)))
+    checks.append(("Perfil incluye ociosos si se pide", any(l.startswith("idle;") for l in with_idle.split("\n"))))
+
+    # 5. TrafficLog: una línea JSON compacta por petición, hash o texto según el modo
+    request = SimpleNamespace(text="Hola mundo", source_lang="auto", target_lang="eng_Latn")
+    with tempfile.TemporaryDirectory() as tmp:
+        hashed_path, text_path = os.path.join(tmp, "h.jsonl"), os.path.join(tmp, "t.jsonl")
+        hashed = TrafficLog(hashed_path, 1.0, store_text=False)
+        hashed.record(1.5, request, 200, 0.25, detected="es", src_nllb="spa_Latn", tokens=4)
+        TrafficLog(text_path, 1.0, store_text=True).record(2.0, request, 503, 0.0)
+        with open(hashed_path, encoding="utf-8") as f:
+            line = f.readline()
+        with open(text_path, encoding="utf-8") as f:
+            text_entry = json.loads(f.readline())
+    entry = json.loads(line)
+    checks.append(("Traza: formato compacto", " " not in line.strip() and entry == {
+        "t": 1.5, "h": entry["h"], "sl": "auto", "tl": "eng_Latn", "dl": "es", "sn": "spa_Latn",
+        "n": 10, "nt": 4, "lat": 0.25, "st": 200}))
+    checks.append(("Traza: hash sin texto", len(entry["h"]) == 16 and "text" not in entry))
+    checks.append(("Traza: modo texto", text_entry.get("text") == "Hola mundo" and "h" not in text_entry
+                   and text_entry["st"] == 503))
+    checks.append(("Traza: desactivada sin ruta", not TrafficLog("", 1.0, False).should_sample()))
+
+    # 6. replay_trace: carga tolerante, idioma forzado y relleno del mismo idioma/longitud
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, "trace.jsonl")
+        with open(trace_path, "w", encoding="utf-8") as f:
+            f.write('{"t":2,"h":"a","tl":"spa_Latn"}\n{"t":1,"h":"b","tl":"spa_Latn"}\n{"t":3,"h"')
+        trace = replay_trace.load_trace(trace_path)
+    checks.append(("Replay: ignora línea truncada y ordena", [e["t"] for e in trace] == [1, 2]))
+
+    corpus = replay_trace.load_corpus()
+    hashed_entry = {"t": 0, "h": "00ff", "sl": "auto", "tl": "spa_Latn", "dl": "eu", "sn": "eus_Latn", "n": 300, "nt": 40}
+    payload, matched = replay_trace.build_payload(hashed_entry, corpus)
+    checks.append(("Replay: fuerza el código NLLB (sn)", payload["source_lang"] == "eus_Latn" and matched))
+    checks.append(("Replay: relleno en el idioma original",
+                   payload["text"].split()[0] in " ".join(corpus["eus_Latn"])))
+    checks.append(("Replay: longitud en caracteres", len(payload["text"]) <= 300 and len(payload["text"]) >= 295))
+
+    text, _ = replay_trace.synthesize_text(hashed_entry, corpus, WordTokenizer())
+    checks.append(("Replay: longitud en tokens", len(text.split()) + 2 == 40))
+
+    unknown = dict(hashed_entry, sn="swh_Latn")
+    checks.append(("Replay: informa idioma sin corpus", replay_trace.build_payload(unknown, corpus)[1] is False))
+
+    original = dict(hashed_entry, text="Kaixo mundua")
+    payload, _ = replay_trace.build_payload(original, corpus)
+    checks.append(("Replay: texto original intacto", payload == {
+        "text": "Kaixo mundua", "source_lang": "auto", "target_lang": "spa_Latn"}))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
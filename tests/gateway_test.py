@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+# Réplicas simuladas en puertos locales (no cargan el modelo)
+REPLICA_PORTS = [8101, 8102, 8103]
+GATEWAY_PORT = 8100
+GATEWAY_URL = f"http://127.0.0.1:{GATEWAY_PORT}"
+REPLICA_LATENCY = 0.2
+
+os.environ["GATEWAY_REPLICAS"] = ",".join(f"http://127.0.0.1:{p}" for p in REPLICA_PORTS)
+os.environ["GATEWAY_HEALTH_INTERVAL"] = "0.2"
+os.environ["GATEWAY_MAX_QUEUE_DEPTH"] = "4"
+os.environ["GATEWAY_MAX_BATCH_SIZE"] = "16"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gateway  # noqa: E402  (lee la configuración del entorno al importarse)
+
+def make_stand_in(port):
+    """Réplica falsa con la misma forma de respuesta que main.py."""
+    app = FastAPI()
+    app.state.overloaded = False
+    app.state.queue_depth = 0
+    app.state.served = 0
+
+    @app.post("/translate")
+    async def translate(body: dict):
+        # Igual que main.py arrancado con MAX_QUEUED_REQUESTS
+        if app.state.overloaded:
+            raise HTTPException(status_code=503, detail="Server overloaded")
+        if body["text"].startswith("INVALID"):
+            raise HTTPException(status_code=422, detail="invalid text")
+        if body["text"].startswith("GARBLED"):
+            return PlainTextResponse("not json")
+        app.state.served += 1
+        await asyncio.sleep(REPLICA_LATENCY)
+        return {
+            "alternatives": [],
+            "detectedLanguage": {"confidence": 100.0, "language": "en"},
+            "translatedText": f"[{port}] {body['text']}",
+            "processing_time": f"{REPLICA_LATENCY:.2f}s",
+        }
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "resource_usage": {
+            "active_tasks_semaphore": 0, "queued_requests": app.state.queue_depth}}
+
+    return app
+
+def serve(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+def served_by(response):
+    return int(response.headers["X-Served-By"].rsplit(":", 1)[1])
+
+async def connect_timeout_falls_through():
+    """Una réplica que no acepta conexiones (ConnectTimeout) se salta sin esperar."""
+    text = "Unreachable replica"
+    order = gateway.route(gateway.routing_key(text, "auto", "spa_Latn"))
+
+    def handler(request):
+        if request.url.port == int(order[0].url.rsplit(":", 1)[1]):
+            raise httpx.ConnectTimeout("blackholed", request=request)
+        return httpx.Response(200, json={"translatedText": "ok"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        replica, _ = await gateway.forward(client, {"text": text, "source_lang": "auto", "target_lang": "spa_Latn"})
+    skipped = replica is not order[0] and not order[0].healthy
+    order[0].healthy = True
+    return skipped
+
+def run_checks():
+    stand_ins = {port: make_stand_in(port) for port in REPLICA_PORTS}
+    for port, app in stand_ins.items():
+        serve(app, port)
+    serve(gateway.app, GATEWAY_PORT)
+
+    checks = []
+    with httpx.Client(base_url=GATEWAY_URL, timeout=10.0) as client:
+        def translate(text):
+            return client.post("/translate", json={"text": text, "target_lang": "spa_Latn"})
+
+        # 1. Afinidad: el mismo texto (con espacios distintos) va siempre a la misma réplica
+        variants = ["Good morning, how are you?", "  Good morning,   how are you? ", "Good morning,\nhow are you?"]
+        ports = {served_by(translate(v)) for v in variants * 3}
+        checks.append(("Afinidad por texto normalizado", len(ports) == 1))
+
+        # 2. Reparto: textos distintos se distribuyen entre réplicas
+        ports = {served_by(translate(f"Sentence number {i}")) for i in range(30)}
+        checks.append(("Reparto entre réplicas", len(ports) == len(REPLICA_PORTS)))
+
+        # 3. Reintento: si la réplica preferida devuelve 503, responde otra
+        text = "Retry me please"
+        primary = served_by(translate(text))
+        stand_ins[primary].state.overloaded = True
+        response = translate(text)
+        checks.append(("Reintento ante sobrecarga", response.status_code == 200 and served_by(response) != primary))
+        stand_ins[primary].state.overloaded = False
+
+        # 4. Balanceo: una cola profunda en /health desvía el tráfico
+        stand_ins[primary].state.queue_depth = 10
+        time.sleep(0.6)
+        diverted = served_by(translate(text)) != primary
+        stand_ins[primary].state.queue_depth = 0
+        time.sleep(0.6)
+        restored = served_by(translate(text)) == primary
+        checks.append(("Balanceo por profundidad de cola", diverted and restored))
+
+        # 5. Batch: en paralelo y respetando el orden
+        texts = [f"Batch item {i}" for i in range(12)]
+        start = time.perf_counter()
+        response = client.post("/translate/batch", json={"texts": texts, "target_lang": "spa_Latn"})
+        elapsed = time.perf_counter() - start
+        outputs = [t["translatedText"].split("] ", 1)[1] for t in response.json()["translations"]]
+        checks.append(("Batch en paralelo y ordenado", outputs == texts and elapsed < REPLICA_LATENCY * 4))
+
+        # 6. Batch con un elemento inválido: se conservan los demás y el código de la réplica
+        texts = ["Keep me", "INVALID item", "Keep me too"]
+        body = client.post("/translate/batch", json={"texts": texts, "target_lang": "spa_Latn"}).json()
+        checks.append(("Batch con fallo parcial", body["translations"][1] is None
+                       and body["translations"][0] is not None and body["translations"][2] is not None
+                       and body["errors"] == [{"index": 1, "status": 422, "detail": "invalid text"}]))
+
+        body = client.post("/translate/batch", json={"texts": ["Keep me", "GARBLED item"], "target_lang": "spa_Latn"}).json()
+        checks.append(("Respuesta no JSON como error 502", body["translations"][0] is not None
+                       and body["errors"][0]["index"] == 1 and body["errors"][0]["status"] == 502))
+        checks.append(("/translate con respuesta no JSON da 502", translate("GARBLED single").status_code == 502))
+
+        response = client.post("/translate/batch", json={"texts": ["INVALID a", "INVALID b"], "target_lang": "spa_Latn"})
+        checks.append(("Batch todo inválido conserva 4xx", response.status_code == 422))
+
+        response = client.post("/translate/batch", json={"texts": ["x"] * 17, "target_lang": "spa_Latn"})
+        checks.append(("Batch demasiado grande rechazado", response.status_code == 422))
+
+        # 7. ConnectTimeout: se prueba la siguiente réplica del anillo
+        checks.append(("ConnectTimeout reintenta en otra réplica", asyncio.run(connect_timeout_falls_through())))
+
+        # 8. Todas saturadas: 503 del gateway
+        for app in stand_ins.values():
+            app.state.overloaded = True
+        checks.append(("503 si todas están saturadas", translate("Nobody home").status_code == 503))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import httpx
+from tabulate import tabulate
+
+DEFAULT_URL = "http://localhost:8000/translate"
+TIMEOUT_LIMIT = 120.0
+# Frases de relleno por código NLLB (para trazas que solo guardan el hash del texto)
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_corpus.json")
+# Tokenizador de NLLB para igualar el número de tokens capturado (nt)
+DEFAULT_TOKENIZER = "nllb-200-distilled-1.3B"
+
+def load_trace(path):
+    """Carga un log de tráfico (JSON Lines) generado con TRAFFIC_LOG_PATH."""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Una última línea truncada (proceso cortado) no invalida el resto
+                continue
+    entries.sort(key=lambda e: e["t"])
+    return entries
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_tokenizer(path):
+    """Carga el tokenizador de NLLB si está disponible; si no, se iguala en caracteres."""
+    if not path or not os.path.isdir(path):
+        return None
+    try:
+        import transformers
+        return transformers.AutoTokenizer.from_pretrained(path)
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar el tokenizador ({e}); se igualará la longitud en caracteres.")
+        return None
+
+def count_tokens(tokenizer, text, src_lang):
+    # Mismo recuento que main.py (incluye el token de idioma y </s>)
+    tokenizer.src_lang = src_lang
+    return len(tokenizer.encode(text))
+
+def repeat_words(words, count):
+    return " ".join(words[i % len(words)] for i in range(count))
+
+def synthesize_text(entry, corpus, tokenizer=None):
+    """Genera un texto de relleno con el idioma y la longitud del original.
+
+    Los logs sin texto solo guardan su hash: elegimos (de forma determinista)
+    una frase del corpus en el idioma usado en producción (sn) y la repetimos
+    hasta los `nt` tokens capturados, o hasta `n` caracteres sin tokenizador.
+    Devuelve el texto y si se encontró corpus en ese idioma.
+    """
+    seed = int(entry.get("h", "0"), 16)
+    lang = entry.get("sn")
+    pool = corpus.get(lang)
+    matched = bool(pool)
+    if not pool:
+        pool = [sentence for key in sorted(corpus) for sentence in corpus[key]]
+    base = pool[seed % len(pool)]
+
+    target_tokens = entry.get("nt")
+    if tokenizer is not None and target_tokens and lang:
+        words = base.split()
+        # Estimación por la densidad de tokens de la frase base y ajuste fino
+        ratio = count_tokens(tokenizer, base, lang) / len(words)
+        count = max(1, round(target_tokens / ratio))
+        while count_tokens(tokenizer, repeat_words(words, count), lang) < target_tokens:
+            count += 1
+        while count > 1 and count_tokens(tokenizer, repeat_words(words, count - 1), lang) >= target_tokens:
+            count -= 1
+        return repeat_words(words, count), matched
+
+    length = max(1, entry.get("n", len(base)))
+    text = (base + " ") * (length // (len(base) + 1) + 1)
+    return text[:length].strip() or base, matched
+
+def build_payload(entry, corpus, tokenizer=None):
+    """Devuelve el payload a reenviar y si el texto coincide en idioma con el original."""
+    if "text" in entry:
+        payload = {"text": entry["text"], "source_lang": entry.get("sl") or "auto", "target_lang": entry["tl"]}
+        return payload, True
+    # Sin el texto original forzamos el código NLLB que usó producción (sn) y no se
+    # repite la detección de idioma
+    text, matched = synthesize_text(entry, corpus, tokenizer)
+    payload = {
+        "text": text,
+        "source_lang": entry.get("sn") or entry.get("sl") or "auto",
+        "target_lang": entry["tl"],
+    }
+    return payload, matched
+
+def percentiles(values):
+    if not values:
+        return ["N/A"] * 6
+    if len(values) == 1:
+        cuts = [values[0]] * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return [f"{statistics.mean(values):.2f}s", f"{cuts[49]:.2f}s", f"{cuts[89]:.2f}s",
+            f"{cuts[94]:.2f}s", f"{cuts[98]:.2f}s", f"{max(values):.2f}s"]
+
+async def send(client, url, payload, results):
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, json=payload, timeout=TIMEOUT_LIMIT)
+        latency = time.perf_counter() - start
+        results.append((response.status_code, latency))
+    except Exception:
+        results.append(("Timeout", time.perf_counter() - start))
+
+async def replay(entries, payloads, url, speed):
+    """Reenvía la traza en lazo abierto: cada petición sale en su instante
+    original (escalado por `speed`) sin esperar a que terminen las anteriores."""
+    t0 = entries[0]["t"]
+    results = []
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits) as client:
+        start_test = time.perf_counter()
+        tasks = []
+        for entry, payload in zip(entries, payloads):
+            delay = (entry["t"] - t0) / speed - (time.perf_counter() - start_test)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, url, payload, results)))
+        send_window = time.perf_counter() - start_test
+        await asyncio.gather(*tasks)
+        total_time = time.perf_counter() - start_test
+
+    return results, send_window, total_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una traza de tráfico capturada contra un servidor.")
+    parser.add_argument("trace", help="Fichero JSON Lines generado con TRAFFIC_LOG_PATH")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Factor de velocidad (2.0 = el doble de rápido que el original)")
+    parser.add_argument("--limit", type=int, default=0, help="Reproducir solo las N primeras peticiones")
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER,
+                        help="Directorio del tokenizador NLLB para igualar tokens (si no existe, se igualan caracteres)")
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        parser.error("--speed debe ser mayor que 0")
+
+    entries = load_trace(args.trace)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("❌ La traza está vacía.")
+        return
+
+    duration = entries[-1]["t"] - entries[0]["t"]
+    print(f"🚀 Reproduciendo {len(entries)} peticiones ({duration:.1f}s originales) a x{args.speed} contra {args.url}")
+
+    corpus = load_corpus()
+    tokenizer = load_tokenizer(args.tokenizer)
+    built = [build_payload(e, corpus, tokenizer) for e in entries]
+    payloads = [payload for payload, _ in built]
+    synthesized = sum(1 for e in entries if "text" not in e)
+    mismatched = sum(1 for _, matched in built if not matched)
+
+    results, send_window, total_time = asyncio.run(replay(entries, payloads, args.url, args.speed))
+
+    ok = [lat for status, lat in results if status == 200]
+    errors = len(results) - len(ok)
+    captured = [e["lat"] for e in entries if e.get("st") == 200 and e.get("lat") is not None]
+
+    headers = ["Origen", "Éxitos", "Media", "P50", "P90", "P95", "P99", "Máx"]
+    table_data = [
+        ["Replay", len(ok)] + percentiles(ok),
+        ["Producción (capturado)", len(captured)] + percentiles(captured),
+    ]
+    print("\n📊 LATENCIAS:")
+    print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
+    print(f"\n📨 Tasa ofrecida: {len(entries)/send_window if send_window > 0 else float('inf'):.2f} req/s")
+    print(f"⚡ Throughput: {len(ok)/total_time:.2f} req/s")
+    print(f"❌ Errores/Timeouts: {errors}")
+    print(f"⏱️ Tiempo total: {total_time:.2f}s")
+    if synthesized:
+        unit = "tokens" if tokenizer is not None else "caracteres"
+        print(f"🔤 Texto de relleno: {synthesized} peticiones (longitud igualada en {unit}), "
+              f"{mismatched} sin corpus en su idioma")
+
+if __name__ == "__main__":
+    main()